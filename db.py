@@ -1,21 +1,257 @@
 # db.py
+import contextlib
 import pyodbc
-from typing import List, Dict, Any
+import queue
+import threading
+import time
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from fastapi import HTTPException
+import hashlib
 import logging
 import re
+from settings import SCHOOL_DSN
 
 logger = logging.getLogger(__name__)
 
+# turbodbc releases the GIL during fetch and materializes results column-wise,
+# which is far faster than pyodbc for SELECT-heavy workloads. It needs a
+# native build, so it stays optional; without it every query uses pyodbc.
+try:
+    import pyarrow.types
+    import turbodbc
+except ImportError:
+    turbodbc = None
+
+# Enable ODBC driver-manager pooling before the first connect is made
+pyodbc.pooling = True
+
+# Compiled once at import - execute_query runs these on every request
+_SCHEMA_PREFIX_RE = re.compile(r'schools\.(\w+)', re.IGNORECASE)
+_BACKTICK_TABLE = str.maketrans('', '', '`')
+
+# How long cached SELECT results stay valid, and how many result sets may
+# be held at once - each entry is a fully materialized result list
+_RESULT_CACHE_TTL = 30.0  # seconds
+_RESULT_CACHE_SIZE = 256
+
+# Upper bound on pooled connections; also sizes the DB thread pool in main.py
+POOL_MAX_SIZE = 10
+
+# Rows fetched per round-trip when streaming SELECT results
+_FETCH_BATCH_SIZE = 1024
+
+# Cursors kept per connection for plan reuse
+_PREPARED_CACHE_SIZE = 64
+
+# Locates the WHERE clause so only its literals get parameterized
+_WHERE_SPLIT_RE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+# Clauses after WHERE whose numbers are not filter values - ORDER BY 1 sorts
+# by column ordinal and SQL Server rejects a parameter marker there
+_CLAUSE_BOUNDARY_RE = re.compile(
+    r'\b(?:GROUP\s+BY|HAVING|ORDER\s+BY|OFFSET)\b', re.IGNORECASE
+)
+
+# Matches quoted strings (with '' escapes, optional N prefix) and bare
+# numeric literals; the lookbehind keeps the fraction of '.5' intact
+_LITERAL_RE = re.compile(r"(?:\b[Nn])?'((?:[^']|'')*)'|(?<!\.)\b(\d+(?:\.\d+)?)\b")
+
+def _parameterize(query: str) -> Tuple[str, Tuple]:
+    """Pull literals out of the WHERE clause into a params tuple, so queries
+    that differ only in their filter values share one statement template -
+    and therefore one server-side plan"""
+    match = _WHERE_SPLIT_RE.search(query)
+    if not match:
+        return query, ()
+
+    head, tail = query[:match.end()], query[match.end():]
+
+    # Parameterize only up to the next clause boundary; anything from
+    # GROUP BY/HAVING/ORDER BY/OFFSET onward stays literal
+    rest = ""
+    boundary = _CLAUSE_BOUNDARY_RE.search(tail)
+    if boundary:
+        rest = tail[boundary.start():]
+        tail = tail[:boundary.start()]
+    params = []
+
+    def _replace(literal):
+        if literal.group(1) is not None:
+            params.append(literal.group(1).replace("''", "'"))
+        else:
+            number = literal.group(2)
+            params.append(float(number) if '.' in number else int(number))
+        return '?'
+
+    return head + _LITERAL_RE.sub(_replace, tail) + rest, tuple(params)
+
+def _bytes_to_str(value):
+    return str(value) if value is not None else None
+
+def _converters_for(description) -> List[Optional[Callable[[Any], Any]]]:
+    """Build one converter per column from cursor.description, so type
+    dispatch happens once per column instead of once per cell. Date and
+    datetime values pass through untouched - orjson at the response layer
+    encodes them natively; only raw bytes need stringifying since orjson
+    cannot serialize them."""
+    converters = []
+    for column in description:
+        if column[1] in (bytes, bytearray):
+            converters.append(_bytes_to_str)
+        else:
+            converters.append(None)
+    return converters
+
 class DatabaseConnection:
-    def __init__(self):
-        self.connection_string = (
-            "DRIVER={SQL Server};"
-            "SERVER=PKLAHLTPG3A;"
-            "DATABASE=school;"  # Connecting to school database
-            "Trusted_Connection=yes;"
-        )
-    
+    def __init__(self, min_size: int = 2, max_size: int = POOL_MAX_SIZE):
+        self.connection_string = SCHOOL_DSN
+
+        # Process-wide pool of reusable connections - opening a fresh ODBC
+        # connection per request pays the full TCP + auth + driver-init cost
+        self._pool: queue.Queue = queue.Queue(maxsize=max_size)
+
+        # Result cache for SELECT queries, keyed by query hash; any write
+        # through this connection invalidates it wholesale
+        self._result_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._cache_lock = threading.Lock()
+
+        # Separate pool of lazily-opened turbodbc connections for the bulk
+        # SELECT path, so concurrent SELECTs actually run in parallel
+        self._turbo_pool: queue.Queue = queue.Queue(maxsize=max_size)
+
+        # Per-connection cursor cache keyed by statement template; reusing a
+        # cursor for the same SQL lets pyodbc keep the prepared statement
+        # (and SQL Server the cached plan) alive across calls
+        self._prepared: Dict[int, Dict[str, pyodbc.Cursor]] = {}
+
+        # Pre-warm the pool; tolerate failure so the app can still start
+        # when the database is temporarily unreachable
+        for _ in range(min_size):
+            try:
+                self._pool.put_nowait(pyodbc.connect(self.connection_string))
+            except pyodbc.Error as e:
+                logger.warning(f"Could not pre-warm connection pool: {str(e)}")
+                break
+
+    def _acquire(self) -> pyodbc.Connection:
+        """Get a validated connection from the pool, opening one if needed"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return pyodbc.connect(self.connection_string)
+
+            # Validate before handing out; discard stale connections
+            try:
+                conn.execute("SELECT 1")
+                return conn
+            except pyodbc.Error:
+                self._discard(conn)
+
+    def _release(self, conn: pyodbc.Connection):
+        """Return a connection to the pool, resetting any open transaction"""
+        try:
+            conn.rollback()
+            self._pool.put_nowait(conn)
+        except (pyodbc.Error, queue.Full):
+            self._discard(conn)
+
+    def _discard(self, conn: pyodbc.Connection):
+        """Close a dead or surplus connection"""
+        self._prepared.pop(id(conn), None)
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+    def _cursor_for(self, conn: pyodbc.Connection, template: str) -> pyodbc.Cursor:
+        """Get the cursor dedicated to this statement template on this
+        connection, creating it on first use. The connection is held
+        exclusively by the calling thread, so its cursor dict needs no lock"""
+        cursors = self._prepared.setdefault(id(conn), {})
+        cursor = cursors.get(template)
+        if cursor is None:
+            if len(cursors) >= _PREPARED_CACHE_SIZE:
+                cursors.clear()
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            cursors[template] = cursor
+        return cursor
+
+    def _cache_results(self, cache_key: str, results: List[Dict[str, Any]]):
+        """Insert into the result cache, pruning expired entries and bounding
+        the size so a read-heavy workload cannot grow memory without limit"""
+        now = time.monotonic()
+        with self._cache_lock:
+            if len(self._result_cache) >= _RESULT_CACHE_SIZE:
+                for key, (ts, _) in list(self._result_cache.items()):
+                    if now - ts >= _RESULT_CACHE_TTL:
+                        del self._result_cache[key]
+                # Still full after pruning - drop oldest-inserted entries
+                while len(self._result_cache) >= _RESULT_CACHE_SIZE:
+                    self._result_cache.pop(next(iter(self._result_cache)))
+            self._result_cache[cache_key] = (now, results)
+
+    @contextlib.contextmanager
+    def acquire(self):
+        """Borrow a pooled connection for direct cursor use"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _acquire_turbo(self):
+        """Get a turbodbc connection from its pool, opening one if needed"""
+        try:
+            return self._turbo_pool.get_nowait()
+        except queue.Empty:
+            return turbodbc.connect(connection_string=self.connection_string)
+
+    def _release_turbo(self, conn):
+        """Return a turbodbc connection to its pool"""
+        try:
+            self._turbo_pool.put_nowait(conn)
+        except queue.Full:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _fetch_with_turbodbc(self, query: str) -> List[Dict[str, Any]]:
+        """Run a SELECT through turbodbc's columnar (Arrow) fetch path.
+        Each call borrows its own pooled connection, so concurrent SELECTs
+        run in parallel while turbodbc releases the GIL during fetch."""
+        conn = self._acquire_turbo()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            table = cursor.fetchallarrow()
+        except Exception:
+            # Connection state is unknown after a failure - close it rather
+            # than returning it to the pool
+            try:
+                conn.close()
+            except Exception:
+                pass
+            raise
+        self._release_turbo(conn)
+
+        rows = table.to_pylist()
+
+        # Match the pyodbc path: orjson cannot serialize raw bytes, so
+        # binary (varbinary) columns get stringified
+        binary_columns = [
+            field.name for field in table.schema
+            if pyarrow.types.is_binary(field.type)
+            or pyarrow.types.is_large_binary(field.type)
+            or pyarrow.types.is_fixed_size_binary(field.type)
+        ]
+        for name in binary_columns:
+            for row in rows:
+                row[name] = _bytes_to_str(row[name])
+        return rows
+
     def execute_query(self, query: str) -> List[Dict[str, Any]]:
         """
         Execute SQL query with simple syntax corrections
@@ -23,58 +259,118 @@ class DatabaseConnection:
         try:
             # Store original query for logging
             original_query = query
-            
+
             # Remove backticks (MySQL style) from the query
-            query = query.replace('`', '')
-            
+            query = query.translate(_BACKTICK_TABLE)
+
             # Simplify query - replace 'schools.details' with just 'details'
-            simplified_query = re.sub(
-                r'schools\.([a-zA-Z0-9_]+)', 
-                r'\1', 
-                query, 
-                flags=re.IGNORECASE
-            )
-            
-            # Log the transformation if query was changed
-            if simplified_query != original_query:
+            simplified_query = _SCHEMA_PREFIX_RE.sub(r'\1', query)
+
+            # re.sub returns the input object untouched when nothing matched,
+            # so an identity check avoids rescanning the string
+            if simplified_query is not query:
                 logger.info(f"Transformed query from: {original_query}")
                 logger.info(f"To: {simplified_query}")
                 query = simplified_query
-            
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
+
+            # Serve repeated SELECTs from the result cache while fresh
+            is_select = query.lstrip()[:6].upper() == "SELECT"
+            cache_key = hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+            if is_select:
+                with self._cache_lock:
+                    cached = self._result_cache.get(cache_key)
+                    if cached and time.monotonic() - cached[0] < _RESULT_CACHE_TTL:
+                        logger.info("Returning cached results for query")
+                        return cached[1]
+
+            # Prefer the turbodbc columnar path for SELECTs when available;
+            # DDL/DML stays on pyodbc
+            if is_select and turbodbc is not None:
+                try:
+                    results = self._fetch_with_turbodbc(query)
+                    self._cache_results(cache_key, results)
+                    return results
+                except Exception as e:
+                    logger.warning(f"turbodbc fetch failed, falling back to pyodbc: {str(e)}")
+
+            # Extract WHERE-clause literals so repeated query shapes reuse
+            # the same template, cursor and server-side plan
+            template, params = _parameterize(query)
+
+            conn = self._acquire()
+            try:
+                cursor = self._cursor_for(conn, template)
+
                 # Execute the query
-                cursor.execute(query)
-                
+                if params:
+                    cursor.execute(template, params)
+                else:
+                    cursor.execute(template)
+
                 # Process results if it's a SELECT query
                 if cursor.description:
                     columns = [column[0] for column in cursor.description]
-                    rows = cursor.fetchall()
+                    converters = _converters_for(cursor.description)
+                    cursor.arraysize = _FETCH_BATCH_SIZE
+
+                    # Stream in batches instead of materializing everything
+                    # with fetchall, converting only columns that need it
                     results = []
-                    for row in rows:
-                        processed_row = [
-                            str(item) if isinstance(item, (bytes, bytearray)) else 
-                            item.strftime('%Y-%m-%d') if hasattr(item, 'strftime') else 
-                            item 
-                            for item in row
-                        ]
-                        results.append(dict(zip(columns, processed_row)))
+                    for batch in iter(lambda: cursor.fetchmany(_FETCH_BATCH_SIZE), []):
+                        results.extend(
+                            dict(zip(columns, [
+                                conv(item) if conv else item
+                                for conv, item in zip(converters, row)
+                            ]))
+                            for row in batch
+                        )
+                    self._cache_results(cache_key, results)
                     return results
-                
+
                 # For non-SELECT queries, return success message
                 conn.commit()  # Ensure changes are committed
+
+                # The write may have changed anything a cached SELECT saw
+                with self._cache_lock:
+                    self._result_cache.clear()
                 return [{"message": "Query executed successfully"}]
-                
+            finally:
+                self._release(conn)
+
         except pyodbc.Error as e:
             # Log the full error with query details
             logger.error(f"Database error executing query: {query}")
             logger.error(f"Error details: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
 
+    def execute_many(self, query: str, seq_of_params: List[Tuple]) -> List[Dict[str, Any]]:
+        """
+        Execute a parameterized statement once per parameter set as one batch
+        """
+        conn = self._acquire()
+        try:
+            cursor = conn.cursor()
+
+            # Ship all parameter sets in a single batched round-trip instead
+            # of pyodbc's default row-at-a-time executemany
+            cursor.fast_executemany = True
+            cursor.executemany(query, seq_of_params)
+            conn.commit()
+
+            # The batch may have changed anything a cached SELECT saw
+            with self._cache_lock:
+                self._result_cache.clear()
+            return [{"message": "Batch executed successfully"}]
+        except pyodbc.Error as e:
+            logger.error(f"Database error executing batch: {query}")
+            logger.error(f"Error details: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Database error: {str(e)}")
+        finally:
+            self._release(conn)
+
 # Create database instance
 db = DatabaseConnection()
 
 def execute_sql(query: str) -> List[Dict[str, Any]]:
     """Execute SQL query against the database"""
-    return db.execute_query(query)
\ No newline at end of file
+    return db.execute_query(query)
@@ -1,21 +1,28 @@
 # main.py
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+import anyio.to_thread
+from typing import Optional, List, Dict, Any, Tuple
 import uvicorn
-from crewai import Agent, Task, Crew, Process
-import requests
+import httpx
+import functools
+import hashlib
+import json
 import logging
+import os
 import re
-from db import DatabaseConnection, execute_sql
+from db import DatabaseConnection, execute_sql, POOL_MAX_SIZE
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create FastAPI app
-app = FastAPI()
+# Create FastAPI app - orjson serializes large result sets (and native
+# date/datetime values) in C instead of stdlib json
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -26,6 +33,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared keep-alive client so concurrent LLM calls reuse connections instead
+# of blocking the event loop the way requests.post did
+_http = httpx.AsyncClient(
+    timeout=30,
+    limits=httpx.Limits(max_keepalive_connections=20),
+)
+app.add_event_handler("shutdown", _http.aclose)
+
+@app.on_event("startup")
+async def _configure_executor():
+    # pyodbc does not reliably release the GIL, so database calls must go
+    # through worker threads (run_in_threadpool) rather than being awaited
+    # directly - asyncio.gather over pyodbc calls alone gives no parallelism.
+    # run_in_threadpool dispatches via anyio's thread pool (default capacity
+    # 40), so cap its limiter to the connection pool size; otherwise surplus
+    # threads would contend for pooled connections and churn overflow ones.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = POOL_MAX_SIZE
+
 # Pydantic models
 class NaturalQuery(BaseModel):
     query: str
@@ -36,35 +61,73 @@ class SQLResponse(BaseModel):
     results: Optional[List[Dict[str, Any]]] = None
     error: Optional[str] = None
 
-def extract_sql_query(response: str) -> Optional[str]:
-    """Extract SQL query from LLM response with enhanced support for all query types"""
-    logger.info(f"Raw LLM response: {response}")
-    
-    # Remove backticks and code blocks
-    clean_response = response.replace('```sql', '').replace('```', '').strip()
-    
-    # Enhanced SQL patterns with more flexible matching
-    patterns = [
-        # SELECT patterns
-        r'(SELECT\s+[\w\s,\*\.]+\s+FROM\s+[\w\s,\.]+(?:\s+WHERE\s+.+?)?(?:\s+ORDER\s+BY\s+.+?)?(?:\s+LIMIT\s+\d+)?;)',
-        r'(SELECT\s+.+?;)',
-        
-        # UPDATE patterns - enhanced to better capture various formats
-        r'(UPDATE\s+[\w\.]+\s+SET\s+[\w\s=,\'"\-\+\.]+(?:\s+WHERE\s+.+?)?;)',
-        r'(UPDATE\s+.+?;)',
-        
+# Use google-re2's linear-time DFA engine for the extraction scan when it is
+# installed - its API is a drop-in for re and it cannot backtrack, so even
+# adversarial LLM output is scanned in O(len). Patterns re2 rejects (and all
+# patterns when re2 is absent) fall back to stdlib re, which keeps the
+# capture-group semantics identical.
+try:
+    import re2 as _re2
+except ImportError:
+    _re2 = None
+
+def _compile_sql_pattern(pattern: str):
+    if _re2 is not None:
+        try:
+            return _re2.compile(pattern, re.IGNORECASE | re.DOTALL)
+        except _re2.error:
+            logger.warning(f"re2 rejected pattern, using stdlib re: {pattern}")
+    return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+# Matches ```sql and bare ``` fences in one scan
+_FENCE_RE = re.compile(r'```(?:sql)?')
+
+# SQL-extraction patterns, compiled once at import. Structured patterns come
+# first, then a single combined fallback for all four statement types. Clauses
+# use [^;]* rather than .+? so the engine cannot backtrack across semicolons.
+_SQL_PATTERNS = tuple(
+    _compile_sql_pattern(pattern)
+    for pattern in (
+        # SELECT pattern
+        r'(SELECT\s+[\w\s,\*\.]+\s+FROM\s+[\w\s,\.]+(?:\s+WHERE\s+[^;]*)?(?:\s+ORDER\s+BY\s+[^;]*)?(?:\s+LIMIT\s+\d+)?;)',
+
+        # UPDATE pattern - enhanced to better capture various formats
+        r'(UPDATE\s+[\w\.]+\s+SET\s+[\w\s=,\'"\-\+\.]+(?:\s+WHERE\s+[^;]*)?;)',
+
         # INSERT patterns
         r'(INSERT\s+INTO\s+[\w\.]+\s*\([^)]+\)\s*VALUES\s*\([^)]+\);)',
         r'(INSERT\s+INTO\s+[\w\.]+\s+VALUES\s*\([^)]+\);)',
-        r'(INSERT\s+INTO\s+.+?;)',
-        
-        # DELETE patterns
-        r'(DELETE\s+FROM\s+[\w\.]+(?:\s+WHERE\s+.+?)?;)',
-        r'(DELETE\s+.+?;)'
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, clean_response, re.IGNORECASE | re.DOTALL)
+
+        # DELETE pattern
+        r'(DELETE\s+FROM\s+[\w\.]+(?:\s+WHERE\s+[^;]*)?;)',
+
+        # Combined loose fallback for anything the structured patterns missed
+        r'((?:SELECT|UPDATE|INSERT\s+INTO|DELETE)\s+[^;]*;)',
+    )
+)
+
+def extract_sql_query(response: str) -> Optional[str]:
+    """Extract SQL query from LLM response with enhanced support for all query types"""
+    logger.info(f"Raw LLM response: {response}")
+
+    # Remove backticks and code blocks in a single pass
+    clean_response = _FENCE_RE.sub('', response).strip()
+
+    # At temperature 0.1 the model usually answers with a bare statement;
+    # take it as-is and skip the regex pipeline entirely. Only safe when any
+    # semicolon is the final character - a semicolon mid-response means
+    # trailing prose that the patterns below know to cut off.
+    if (clean_response.lstrip()[:6].upper() in _QUERY_TYPES
+            and '```' not in response
+            and ';' not in clean_response.rstrip(';')):
+        query = clean_response.rstrip()
+        if not query.endswith(';'):
+            query += ';'
+        logger.info(f"Using bare response as SQL query: {query}")
+        return query
+
+    for pattern in _SQL_PATTERNS:
+        match = pattern.search(clean_response)
         if match:
             query = match.group(1).strip()
             logger.info(f"Extracted query: {query}")
@@ -83,36 +146,37 @@ def extract_sql_query(response: str) -> Optional[str]:
     logger.warning("No SQL query found in response")
     return None
 
+# All four statement keywords happen to be six characters, so classification
+# only needs to look at the leading keyword rather than uppercase the whole query
+_QUERY_TYPES = {
+    "SELECT": "SELECT",
+    "UPDATE": "UPDATE",
+    "INSERT": "INSERT",
+    "DELETE": "DELETE",
+}
+
 def identify_query_type(query: str) -> str:
     """Identify the type of SQL query"""
     if not query:
         return "UNKNOWN"
-    
-    query_upper = query.upper().strip()
-    
-    if query_upper.startswith("SELECT"):
-        return "SELECT"
-    elif query_upper.startswith("UPDATE"):
-        return "UPDATE"
-    elif query_upper.startswith("INSERT"):
-        return "INSERT"
-    elif query_upper.startswith("DELETE"):
-        return "DELETE"
-    else:
-        return "UNKNOWN"
+
+    return _QUERY_TYPES.get(query.lstrip()[:6].upper(), "UNKNOWN")
 
 def remove_unwanted_where_clause(sql_query: str) -> str:
     """Remove WHERE clauses from SQL when not needed"""
     if sql_query is None:
         return None
         
+    # One uppercase copy serves all the positional checks below
+    query_upper = sql_query.upper()
+
     # For simple SELECT queries with unnecessary WHERE clauses
-    if sql_query.upper().startswith("SELECT"):
+    if query_upper.startswith("SELECT"):
         # Find the position of the FROM clause
-        from_pos = sql_query.upper().find("FROM")
+        from_pos = query_upper.find("FROM")
         if from_pos != -1:
             # Find the position of the WHERE clause
-            where_pos = sql_query.upper().find("WHERE", from_pos)
+            where_pos = query_upper.find("WHERE", from_pos)
             if where_pos != -1:
                 # Return just the part before the WHERE
                 clean_query = sql_query[:where_pos].strip()
@@ -125,57 +189,135 @@ def remove_unwanted_where_clause(sql_query: str) -> str:
     # Return original if no changes needed
     return sql_query
 
+# Keywords that indicate filtering is expected
+_FILTER_KEYWORDS = [
+    "whose", "where", "with", "has", "contains", "starts with", "ends with",
+    "above", "below", "greater than", "less than", "equal to", "is", "are",
+    "before", "after", "between", "like", "matches"
+]
+
+# Scan for all filter keywords in one pass with an Aho-Corasick automaton
+# when pyahocorasick is installed; otherwise fall back to one substring
+# search per keyword
+try:
+    import ahocorasick
+    _FILTER_AUTOMATON = ahocorasick.Automaton()
+    for _keyword in _FILTER_KEYWORDS:
+        _FILTER_AUTOMATON.add_word(_keyword, _keyword)
+    _FILTER_AUTOMATON.make_automaton()
+except ImportError:
+    _FILTER_AUTOMATON = None
+
+def _has_filter_keyword(query_lower: str) -> bool:
+    if _FILTER_AUTOMATON is not None:
+        return next(_FILTER_AUTOMATON.iter(query_lower), None) is not None
+    return any(keyword in query_lower for keyword in _FILTER_KEYWORDS)
+
 def validate_query_intent(query_text: str, sql_query: str) -> str:
     """Validate that the SQL query matches the natural language intent with improved filter handling"""
     if not query_text or not sql_query:
         return sql_query
-        
+
+    # Lowercase each string exactly once and reuse the copies
     query_lower = query_text.lower()
-    
-    # Look for keywords that indicate filtering is expected
-    filter_keywords = [
-        "whose", "where", "with", "has", "contains", "starts with", "ends with",
-        "above", "below", "greater than", "less than", "equal to", "is", "are",
-        "before", "after", "between", "like", "matches"
-    ]
-    
-    has_filter_intent = any(keyword in query_lower for keyword in filter_keywords)
+    sql_lower = sql_query.lower()
+
+    has_filter_intent = _has_filter_keyword(query_lower)
     
     # Only remove WHERE clauses for "show all" when there's no filter intent
     if ("show all" in query_lower or "get all" in query_lower):
-        if has_filter_intent and "where" not in sql_query.lower():
+        if has_filter_intent and "where" not in sql_lower:
             # Missing WHERE clause when filtering was requested
             logger.warning(f"Query requested filtering but no WHERE clause found: {sql_query}")
             # Here we could attempt to add a WHERE clause, but that's more complex
             return sql_query
-        elif not has_filter_intent and "where" in sql_query.lower():
+        elif not has_filter_intent and "where" in sql_lower:
             # Unwanted WHERE clause when no filtering was requested
             logger.warning(f"Query did not request filtering but WHERE clause found: {sql_query}")
             return remove_unwanted_where_clause(sql_query)
     
     return sql_query
 
-def generate_sql_with_llm(query: str) -> str:
+@functools.lru_cache(maxsize=1)
+def _schema_prompt_for(mtime: float) -> str:
+    """Format db_schema.json into the prompt preamble, cached per file mtime"""
+    try:
+        with open('db_schema.json', 'r') as f:
+            schema = json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load schema: {e}")
+        return ""
+
+    parts = ["Database Schema:\n"]
+    for table, details in schema.items():
+        parts.append(f"\nTable: {table}\nColumns:\n")
+        for col in details['columns']:
+            nullable = "NULL" if col['nullable'] else "NOT NULL"
+            pk = "PRIMARY KEY" if col.get('is_primary_key') else ""
+            parts.append(f"- {col['name']} ({col['type']}) {nullable} {pk}\n")
+    return "".join(parts)
+
+def _schema_prompt() -> str:
+    """Return the formatted schema context, re-reading only when the file changes"""
+    try:
+        mtime = os.path.getmtime('db_schema.json')
+    except OSError:
+        return ""
+    return _schema_prompt_for(mtime)
+
+@functools.lru_cache(maxsize=1)
+def _schema_hash_for(mtime: float) -> str:
+    try:
+        with open('db_schema.json', 'rb') as f:
+            return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    except OSError:
+        return ""
+
+def _schema_hash() -> str:
+    """Hash the schema file so cached translations die when the schema
+    changes, re-reading the file only when its mtime moves"""
+    try:
+        mtime = os.path.getmtime('db_schema.json')
+    except OSError:
+        return ""
+    return _schema_hash_for(mtime)
+
+async def generate_sql_with_llm(query: str) -> str:
     """Generate SQL using TinyLlama via Ollama with improved natural language understanding"""
     try:
-        # Read schema from file
-        schema_context = ""
-        try:
-            with open('db_schema.json', 'r') as f:
-                import json
-                schema = json.load(f)
-                schema_context = "Database Schema:\n"
-                for table, details in schema.items():
-                    schema_context += f"\nTable: {table}\nColumns:\n"
-                    for col in details['columns']:
-                        nullable = "NULL" if col['nullable'] else "NOT NULL"
-                        pk = "PRIMARY KEY" if col.get('is_primary_key') else ""
-                        schema_context += f"- {col['name']} ({col['type']}) {nullable} {pk}\n"
-        except Exception as e:
-            logger.warning(f"Failed to load schema: {e}")
-
-        # Add explicit examples for different filter scenarios
-        examples = """
+        # Normalize so trivially different phrasings share a cache slot
+        norm_query = re.sub(r'\s+', ' ', query.strip().lower())
+        sql_query = await _llm_generate(query, norm_query, _schema_hash())
+
+        if sql_query:
+            # Apply additional validation
+            sql_query = validate_query_intent(query, sql_query)
+
+        return sql_query if sql_query else None
+    except Exception as e:
+        logger.error(f"SQL generation error: {str(e)}")
+        return None
+
+# Translation cache for _llm_generate; lru_cache cannot wrap a coroutine, so
+# this is a plain dict with oldest-entry eviction
+_LLM_CACHE_SIZE = 1024
+_llm_cache: Dict[Tuple[str, str], str] = {}
+
+async def _llm_generate(query: str, norm_query: str, schema_hash: str) -> Optional[str]:
+    """Call the LLM endpoint, memoized on (normalized query, schema hash) so
+    repeated prompts skip the round-trip entirely. The prompt keeps the
+    original query text - normalization is for the cache key only, since
+    lowercasing would corrupt case-sensitive values like quoted names.
+    Network errors propagate to the caller and failures are not cached."""
+    cache_key = (norm_query, schema_hash)
+    if cache_key in _llm_cache:
+        return _llm_cache[cache_key]
+
+    # Schema context is cached and only rebuilt when db_schema.json changes
+    schema_context = _schema_prompt()
+
+    # Add explicit examples for different filter scenarios
+    examples = """
 EXAMPLE QUERIES:
 1. "Show all schools"
    SELECT * FROM schools;
@@ -205,7 +347,7 @@ IMPORTANT RULES:
 - Pay close attention to filter words like "whose", "where", "with", etc.
 """
 
-        prompt = f"""
+    prompt = f"""
 {schema_context}
 
 {examples}
@@ -227,103 +369,33 @@ Rules:
 
 SQL Query:"""
 
-        response = requests.post(
-            "http://10.253.1.172:8000/generate",
-            headers={"Content-Type": "application/json"},
-            json={
-                "model": "tinyllama",
-                "prompt": prompt,
-                "system": "You are an advanced SQL query generator. Generate SQL queries that match exactly what was asked. Pay careful attention to when filters are needed vs. when all records are requested.",
-                "temperature": 0.1,
-                "max_tokens": 250
-            }
-        )
-        
-        if response.status_code == 200:
-            llm_response = response.json().get('response', '').strip()
-            sql_query = extract_sql_query(llm_response)
-            
-            if sql_query:
-                # Apply additional validation
-                sql_query = validate_query_intent(query, sql_query)
-                
-            return sql_query if sql_query else None
-        return None
-    except Exception as e:
-        logger.error(f"SQL generation error: {str(e)}")
-        return None
-
-# Create specialized agents
-def create_agents():
-    nlu_agent = Agent(
-        name="NLU Agent",
-        role="Natural Language Understanding Specialist",
-        goal="Understand and preprocess natural language queries for all SQL operations",
-        backstory="Expert in parsing and understanding natural language queries for database operations",
-        allow_delegation=True
-    )
-
-    sql_agent = Agent(
-        name="SQL Generator",
-        role="SQL Query Generator",
-        goal="Generate accurate SQL queries from processed natural language for all operation types",
-        backstory="Specialist in converting natural language to SELECT, UPDATE, INSERT, and DELETE SQL queries using TinyLlama",
-        allow_delegation=True
+    response = await _http.post(
+        "http://10.253.1.172:8000/generate",
+        headers={"Content-Type": "application/json"},
+        json={
+            "model": "tinyllama",
+            "prompt": prompt,
+            "system": "You are an advanced SQL query generator. Generate SQL queries that match exactly what was asked. Pay careful attention to when filters are needed vs. when all records are requested.",
+            "temperature": 0.1,
+            "max_tokens": 250
+        }
     )
 
-    validation_agent = Agent(
-        name="Query Validator",
-        role="SQL Query Validator",
-        goal="Validate and optimize all types of SQL queries",
-        backstory="Expert in SQL validation and optimization for all database operations",
-        allow_delegation=True
-    )
-
-    execution_agent = Agent(
-        name="DB Executor",
-        role="Database Query Executor",
-        goal="Safely execute and handle all types of SQL queries",
-        backstory="Specialist in database operations and error handling for all query types",
-        allow_delegation=True
-    )
-
-    return [nlu_agent, sql_agent, validation_agent, execution_agent]
-
-# Create crew tasks
-def create_tasks(agents):
-    tasks = [
-        Task(
-            description="Analyze and preprocess the natural language query, identifying operation type",
-            agent=agents[0],
-            expected_output="Preprocessed query with identified operation type",
-            output_format="Text with identified intent and key parameters"
-        ),
-        Task(
-            description="Generate appropriate SQL query (SELECT, UPDATE, INSERT, or DELETE)",
-            agent=agents[1],
-            expected_output="Valid SQL query for the required operation",
-            output_format="SQL query string matching the database schema"
-        ),
-        Task(
-            description="Validate and optimize the generated SQL query",
-            agent=agents[2],
-            expected_output="Validated and optimized SQL query",
-            output_format="Validated SQL query string with optimizations"
-        ),
-        Task(
-            description="Execute the validated SQL query and handle results",
-            agent=agents[3],
-            expected_output="Query results or operation status",
-            output_format="JSON formatted results or status message"
-        )
-    ]
-    return tasks
+    if response.status_code == 200:
+        llm_response = response.json().get('response', '').strip()
+        sql_query = extract_sql_query(llm_response)
+        if sql_query:
+            if len(_llm_cache) >= _LLM_CACHE_SIZE:
+                _llm_cache.pop(next(iter(_llm_cache)))
+            _llm_cache[cache_key] = sql_query
+        return sql_query
+    return None
 
 @app.post("/query/", response_model=SQLResponse)
 async def process_query(query: NaturalQuery):
     try:
         # Generate SQL
-        sql_query = generate_sql_with_llm(query.query)
+        sql_query = await generate_sql_with_llm(query.query)
         
         if not sql_query:
             return SQLResponse(
@@ -339,9 +411,9 @@ async def process_query(query: NaturalQuery):
         query_type = identify_query_type(sql_query)
         logger.info(f"Query type: {query_type}")
         
-        # Execute query
+        # Execute query off the event loop - pyodbc blocks the calling thread
         try:
-            results = execute_sql(sql_query)
+            results = await run_in_threadpool(execute_sql, sql_query)
             
             # For non-SELECT queries, results might be empty, so add feedback
             if query_type != "SELECT" and (not results or len(results) == 0):
@@ -368,4 +440,19 @@ async def process_query(query: NaturalQuery):
         )
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    if os.getenv("DEV"):
+        # Single-process auto-reload mode for local development only
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    else:
+        # Production: httptools on the hot path, one worker pool per core
+        # rule of thumb; loop="auto" picks uvloop where it is installed
+        # (it neither builds nor runs on Windows)
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=(os.cpu_count() or 1) * 2 + 1,
+            loop="auto",
+            http="httptools",
+            reload=False,
+        )
\ No newline at end of file
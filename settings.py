@@ -0,0 +1,9 @@
+# settings.py
+# Shared connection settings so db.py and test_schema.py cannot drift apart
+
+SCHOOL_DSN = (
+    "DRIVER={SQL Server};"
+    "SERVER=PKLAHLTPG3A;"
+    "DATABASE=school;"  # Connecting to school database
+    "Trusted_Connection=yes;"
+)
@@ -1,23 +1,19 @@
 # school_schema.py
-import pyodbc
 import json
 import logging
 
+from db import db
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def extract_school_schema():
     """Extract schema information specifically from the school database"""
-    connection_string = (
-        "DRIVER={SQL Server};"
-        "SERVER=PKLAHLTPG3A;"
-        "DATABASE=school;"  # Connect directly to school database
-        "Trusted_Connection=yes;"
-    )
-    
     try:
         schema = {}
-        with pyodbc.connect(connection_string) as conn:
+        # Borrow a connection from the shared pool rather than opening a
+        # one-off handle with a duplicated connection string
+        with db.acquire() as conn:
             cursor = conn.cursor()
             
             # Get all tables in the school database
@@ -63,41 +59,19 @@ def extract_school_schema():
                 c.ORDINAL_POSITION;
             """)
             
-            rows = cursor.fetchall()
-            
-            # Process results
-            for row in rows:
-                schema_name = row[0]
-                table_name = row[1]
-                full_table_name = table_name
-                
-                column_info = {
-                    'name': row[2],
-                    'type': row[3],
-                    'max_length': row[4],
-                    'nullable': row[5] == 'YES',
-                    'is_primary_key': row[6] == 'YES'
-                }
-                
-                if full_table_name not in schema:
-                    schema[full_table_name] = {'columns': []}
-                schema[full_table_name]['columns'].append(column_info)
-            
-            # Prepare formatted schema for LLM prompting
-            formatted_schema = "Database Schema for 'school':\n"
-            for table_name, details in schema.items():
-                formatted_schema += f"\nTable: {table_name}\nColumns:\n"
-                for col in details['columns']:
-                    nullable = "NULL" if col['nullable'] else "NOT NULL"
-                    pk = "PRIMARY KEY" if col['is_primary_key'] else ""
-                    type_info = f"{col['type']}"
-                    if col['max_length']:
-                        type_info += f"({col['max_length']})"
-                    formatted_schema += f"- {col['name']} ({type_info}) {nullable} {pk}\n"
-            
-            # Print the formatted schema for easy copying
-            logger.info("\nFormatted Schema for LLM Prompting:")
-            logger.info(formatted_schema)
+            # Stream rows in batches so memory stays flat however large
+            # the schema grows
+            cursor.arraysize = 500
+            for batch in iter(lambda: cursor.fetchmany(500), []):
+                for row in batch:
+                    table_name = row[1]
+                    schema.setdefault(table_name, {'columns': []})['columns'].append({
+                        'name': row[2],
+                        'type': row[3],
+                        'max_length': row[4],
+                        'nullable': row[5] == 'YES',
+                        'is_primary_key': row[6] == 'YES'
+                    })
         
         # Write schema to file
         with open('school_schema.json', 'w') as f: